@@ -7,11 +7,15 @@ import time
 from datetime import datetime, timezone
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Project utility imports
 from utils import (
     apply_calibration,
+    compile_calibration,
     csv_writer,
     ensure_dir,
+    fs_is_durable,
     load_config,
     setup_logger,
 )
@@ -21,6 +25,9 @@ from iot import IoTHubSender
 import Legacy_led
 import ext_led
 
+# Load environment variables from .env file
+load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+
 # Configuration paths and environment
 CONFIG_PATH = os.environ.get("EDGE_CONFIG", str(Path(__file__).parent.parent / "config.yaml"))
 USB_MOUNT = Path(os.environ.get("USB_MOUNT", "/mnt/usb-data"))
@@ -72,7 +79,7 @@ def main():
     
     # Priority: yaml config > environment var > hardcoded default
     device_id = cfg.get("device", {}).get("id") or os.environ.get("DEVICE_ID") or "pi-node-01"
-    calibration = cfg.get("calibration", {})
+    calibration = compile_calibration(cfg.get("calibration", {}))
     iot_cfg = cfg.get("iot", {}) if isinstance(cfg, dict) else {}
 
     # Initialize LED status indicators
@@ -131,11 +138,13 @@ def main():
         if iot_enabled:
             logger.warning("IoT Hub geactiveerd maar geen IOTHUB_DEVICE_CONNECTION_STRING; IoT uit")
 
-    # Capture an initial reading to learn which ADC channels are present
-    header = create_headers(counters, adc_manager.get_channel_names())
+    # ADC channel names come from the config; no reading needed to learn them
+    adc_channels = adc_manager.get_channel_names()
+    header = create_headers(counters, adc_channels)
 
     # Open CSV file for writing
-    file_handle, writer, csv_path = csv_writer(USB_MOUNT, device_id, header)
+    fs_durable = fs_is_durable(USB_MOUNT)
+    file_handle, writer, csv_path = csv_writer(USB_MOUNT, device_id, header, sync_header=fs_durable)
     logger.info("Writing CSV to %s", csv_path)
 
     # Signal successful startup
@@ -157,12 +166,13 @@ def main():
         # Read raw ADC values, calibrate them, then write in column order
         adc_raw = adc_manager.read_all()
         adc_calibrated = apply_calibration(adc_raw, calibration)
-        adc_values = [adc_calibrated.get(channel) for channel in adc_manager.get_channel_names()]
+        adc_values = [adc_calibrated.get(channel) for channel in adc_channels]
 
         # Write all sensor values to CSV
         writer.writerow([timestamp_utc] + pulse_values + adc_values)
         file_handle.flush()
-        os.fsync(file_handle.fileno())
+        if fs_durable:
+            os.fsync(file_handle.fileno())
 
         # Blink LED to indicate successful sample
         status_led.heartbeat()
@@ -174,7 +184,7 @@ def main():
                 payload = {
                     "timestamp": timestamp_utc,
                     "pulses": {name: val for (name, _), val in zip(counters, pulse_values)},
-                    "adc": {channel: val for channel, val in zip(adc_manager.get_channel_names(), adc_values)},
+                    "adc": {channel: val for channel, val in zip(adc_channels, adc_values)},
                 }
                 iot.send("data", payload)
             except Exception:
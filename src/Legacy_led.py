@@ -8,6 +8,8 @@ Supports ACT (green) LED on Pi 4/5 for status signaling:
 """
 
 import logging
+import os
+import queue
 import threading
 import time
 from pathlib import Path
@@ -36,7 +38,10 @@ class StatusLED:
         self.enabled = enabled
         self.led_path = LED_PATHS.get(led_name)
         self.original_trigger: Optional[str] = None
-        self._lock = threading.Lock()
+        self._bright_fd: Optional[int] = None
+        # Blink patterns are played one after another by a single worker thread
+        self._queue: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._worker_thread: Optional[threading.Thread] = None
         
         if not self.enabled:
             logger.info("LED status indicator disabled")
@@ -59,6 +64,8 @@ class StatusLED:
             
             # Set trigger to none for manual control
             trigger_path.write_text("none")
+            # Keep brightness open; every blink edge is then a single write()
+            self._bright_fd = os.open(str(self.led_path / "brightness"), os.O_WRONLY)
             logger.info("LED %s initialized (original trigger: %s)", led_name, self.original_trigger)
         except PermissionError:
             logger.warning("No permission to control LED %s (run as root or add user to gpio group)", led_name)
@@ -67,13 +74,16 @@ class StatusLED:
             logger.warning("Failed to initialize LED %s: %s", led_name, exc)
             self.enabled = False
 
+        if self.enabled:
+            self._worker_thread = threading.Thread(target=self._worker, daemon=True)
+            self._worker_thread.start()
+
     def _set_brightness(self, value: int) -> None:
         """Set LED brightness (0=off, 1=on)."""
         if not self.enabled:
             return
         try:
-            brightness_path = self.led_path / "brightness"
-            brightness_path.write_text(str(value))
+            os.pwrite(self._bright_fd, b"1" if value else b"0", 0)
         except Exception:
             pass  # Silently ignore LED errors
 
@@ -81,28 +91,49 @@ class StatusLED:
         """Blink the LED with specified timing."""
         if not self.enabled:
             return
-        with self._lock:
-            for _ in range(count):
-                self._set_brightness(1)
-                time.sleep(on_ms / 1000.0)
-                self._set_brightness(0)
-                if off_ms > 0:
-                    time.sleep(off_ms / 1000.0)
+        for _ in range(count):
+            self._set_brightness(1)
+            time.sleep(on_ms / 1000.0)
+            self._set_brightness(0)
+            if off_ms > 0:
+                time.sleep(off_ms / 1000.0)
+
+    def _worker(self) -> None:
+        """Play queued blink patterns until a None sentinel arrives."""
+        while True:
+            pattern = self._queue.get()
+            if pattern is None:
+                return
+            self._blink(*pattern)
+
+    def _enqueue(self, on_ms: int, off_ms: int, count: int) -> None:
+        if self.enabled:
+            self._queue.put((on_ms, off_ms, count))
 
     def heartbeat(self) -> None:
         """Single short blink indicating successful sample."""
-        threading.Thread(target=self._blink, args=(50, 0, 1), daemon=True).start()
+        self._enqueue(50, 0, 1)
 
     def error(self) -> None:
         """Rapid triple blink indicating an error."""
-        threading.Thread(target=self._blink, args=(100, 100, 3), daemon=True).start()
+        self._enqueue(100, 100, 3)
 
     def startup(self) -> None:
         """Long blink indicating service startup."""
-        threading.Thread(target=self._blink, args=(500, 0, 1), daemon=True).start()
+        self._enqueue(500, 0, 1)
 
     def stop(self) -> None:
-        """Restore original LED trigger."""
+        """Stop the blink worker and restore original LED trigger."""
+        if self._worker_thread:
+            self._queue.put(None)
+            self._worker_thread.join(timeout=1.0)
+            self._worker_thread = None
+        if self._bright_fd is not None:
+            try:
+                os.close(self._bright_fd)
+            except OSError:
+                pass
+            self._bright_fd = None
         if not self.enabled or not self.original_trigger:
             return
         try:
@@ -1,49 +1,143 @@
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 import time
 import logging
 
 import board
 import busio
 from adafruit_ads1x15.ads1115 import ADS1115
+from adafruit_ads1x15.ads1x15 import Mode
 from adafruit_ads1x15.analog_in import AnalogIn
 
+try:
+    from smbus2 import SMBus, i2c_msg
+except ImportError:  # fall back to the adafruit driver for every read
+    SMBus = None
+    i2c_msg = None
+
 
 # Gain mapping for ADS1115; defaults to 1 if an unsupported value is given.
 GAIN_MAP = {2 / 3: 2 / 3, 1: 1, 2: 2, 4: 4, 8: 8, 16: 16}
 
+# Continuous conversion at the highest ADS1115 rate; a fresh result is ready
+# every 1/DATA_RATE seconds, so consecutive samples only wait for that period.
+DATA_RATE = 860
+SAMPLE_PERIOD_S = 1.2 / DATA_RATE
+
+# Linux I2C bus used for the direct smbus2 read path (board.SCL/SDA on the Pi).
+I2C_BUS = 1
+
+# ADS1115 registers and config fields (datasheet table 8) for the smbus2 path.
+_REG_CONVERSION = 0x00
+_REG_CONFIG = 0x01
+_PGA_BITS = {2 / 3: 0x0000, 1: 0x0200, 2: 0x0400, 4: 0x0600, 8: 0x0800, 16: 0x0A00}
+_PGA_RANGE_V = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+_DR_BITS = {8: 0x0000, 16: 0x0020, 32: 0x0040, 64: 0x0060, 128: 0x0080, 250: 0x00A0, 475: 0x00C0, 860: 0x00E0}
+_MODE_CONTINUOUS = 0x0000
+_COMP_QUE_DISABLE = 0x0003
+
 logger = logging.getLogger("ads1115")
 
 
 class ADS1115Group:
     """
     Represents a group of ADS1115 ADC channels.
+
+    When an smbus2 bus is given, samples are read straight from the conversion
+    register (one I2C transaction each); otherwise the adafruit driver is used.
     """
 
-    def __init__(self, i2c, address, name, gain, channels: List[dict]):
+    def __init__(self, i2c, address, name, gain, channels: List[dict], bus=None):
         self.name = name
-        self.ads = ADS1115(i2c, address=int(address))
+        self.address = int(address)
+        self.bus = bus
+        self.ads = ADS1115(i2c, address=self.address)
         self.ads.gain = GAIN_MAP.get(float(gain), 1)
+        self.ads.data_rate = DATA_RATE
+        self.ads.mode = Mode.CONTINUOUS
+        self._volts_per_count = _PGA_RANGE_V[self.ads.gain] / 32768.0
+        # Config word last written over smbus2; the register is only
+        # reprogrammed when the MUX actually changes (gain/rate are fixed).
+        self._last_config = None
         self.inputs = {}
-        logger.info("Init ADS1115 group %s addr=0x%02X gain=%s channels=%d", self.name, int(address), self.ads.gain, len(channels or []))
+        logger.info("Init ADS1115 group %s addr=0x%02X gain=%s channels=%d", self.name, self.address, self.ads.gain, len(channels or []))
         for ch in channels or []:
             idx = int(ch["channel"])
             nm = ch["name"]
             samples = max(1, int(ch.get("samples", 1)))
-            self.inputs[nm] = {"cfg": ch, "samples": samples, "ain": AnalogIn(self.ads, idx)}
+            self.inputs[nm] = {
+                "cfg": ch,
+                "channel": idx,
+                "samples": samples,
+                "config": self._config_word(idx),
+                "ain": AnalogIn(self.ads, idx),
+            }
+
+    @staticmethod
+    def _wait_for_conversion(ready_at: float):
+        """Wait until the next continuous-mode conversion is due."""
+        remaining = ready_at - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def _config_word(self, idx: int) -> int:
+        """Config register value for single-ended continuous reads of AIN<idx>."""
+        mux = (0x04 | (idx & 0x03)) << 12
+        return mux | _PGA_BITS[self.ads.gain] | _MODE_CONTINUOUS | _DR_BITS[DATA_RATE] | _COMP_QUE_DISABLE
+
+    def _read_counts_smbus(self, config: int, samples: int) -> List[int]:
+        """Program the MUX if it changed, then read `samples` conversions directly."""
+        if config != self._last_config:
+            self.bus.i2c_rdwr(i2c_msg.write(self.address, [_REG_CONFIG, config >> 8, config & 0xFF]))
+            self._last_config = config
+            # First result after a MUX change needs a full conversion plus settling
+            ready_at = time.perf_counter() + 2.0 / DATA_RATE
+        else:
+            # Same input still converting: the latest result is already valid
+            ready_at = 0.0
+        point = i2c_msg.write(self.address, [_REG_CONVERSION])
+        counts = []
+        for i in range(samples):
+            self._wait_for_conversion(ready_at)
+            read = i2c_msg.read(self.address, 2)
+            if i:
+                self.bus.i2c_rdwr(read)
+            else:
+                self.bus.i2c_rdwr(point, read)
+            ready_at = time.perf_counter() + SAMPLE_PERIOD_S
+            counts.append(int.from_bytes(bytes(read), "big", signed=True))
+        return counts
+
+    def _sample(self, meta: dict):
+        """Return (average raw counts, average voltage) for one input."""
+        samples = meta["samples"]
+        if self.bus is not None:
+            try:
+                counts = self._read_counts_smbus(meta["config"], samples)
+            except OSError:
+                # Device state unknown after a bus error; reprogram next time
+                self._last_config = None
+                raise
+            volts = [c * self._volts_per_count for c in counts]
+            return int(sum(counts) / samples), sum(volts) / samples
+        ain = meta["ain"]
+        total_v = 0.0
+        total_raw = 0
+        ready_at = 0.0  # latest conversion is already valid for the first read
+        for _ in range(samples):
+            self._wait_for_conversion(ready_at)
+            # AnalogIn provides both .voltage and .value; in continuous
+            # mode both return the same latest conversion result.
+            total_v += ain.voltage
+            total_raw += getattr(ain, "value", 0)
+            ready_at = time.perf_counter() + SAMPLE_PERIOD_S
+        return int(total_raw / samples), total_v / samples
 
     def read_voltages(self) -> Dict[str, float]:
         out: Dict[str, float] = {}
         for name, meta in self.inputs.items():
-            ain = meta["ain"]
-            samples = meta["samples"]
-            total = 0.0
-            for _ in range(samples):
-                total += ain.voltage
-                if samples > 1:
-                    time.sleep(0.005)
-            out[name] = total / samples
-            logger.debug("%s ch=%s samples=%d V=%.6f", self.name, name, samples, out[name])
+            _, out[name] = self._sample(meta)
+            logger.debug("%s ch=%s samples=%d V=%.6f", self.name, name, meta["samples"], out[name])
         return out
 
     def read_raw_and_voltage(self) -> Dict[str, dict]:
@@ -53,26 +147,14 @@ class ADS1115Group:
         """
         out: Dict[str, dict] = {}
         for name, meta in self.inputs.items():
-            ain = meta["ain"]
-            samples = meta.get("samples", 1)
-            total_v = 0.0
-            total_raw = 0
-            for _ in range(samples):
-                # AnalogIn provides both .voltage and .value
-                total_v += ain.voltage
-                total_raw += getattr(ain, "value", 0)
-                if samples > 1:
-                    time.sleep(0.005)
-            avg_v = total_v / samples
-            avg_raw = int(total_raw / samples)
+            avg_raw, avg_v = self._sample(meta)
             out[name] = {"raw": avg_raw, "voltage": avg_v, "gain": getattr(self.ads, "gain", None)}
-            logger.debug("%s ch=%s samples=%d raw=%d V=%.6f", self.name, name, samples, avg_raw, avg_v)
+            logger.debug("%s ch=%s samples=%d raw=%d V=%.6f", self.name, name, meta["samples"], avg_raw, avg_v)
         return out
 
 
 import threading
 from collections import deque
-from typing import Optional
 
 
 class ADCManager:
@@ -89,6 +171,12 @@ class ADCManager:
 
     def __init__(self, cfg_list: List[dict], sample_interval_ms: int = 200, window_size: int = 5):
         self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.bus = None
+        if SMBus is not None:
+            try:
+                self.bus = SMBus(I2C_BUS)
+            except Exception as exc:
+                logger.warning("smbus2 open of /dev/i2c-%d failed, using adafruit driver: %s", I2C_BUS, exc)
         self.groups = [
             ADS1115Group(
                 self.i2c,
@@ -96,6 +184,7 @@ class ADCManager:
                 name=g.get("name", "ads"),
                 gain=g.get("gain", 1),
                 channels=g.get("channels", []),
+                bus=self.bus,
             )
             for g in (cfg_list or [])
         ]
@@ -115,6 +204,8 @@ class ADCManager:
                     "voltage": deque(maxlen=self.window_size),
                     "gain": grp.ads.gain,  # or None if you prefer
                 }
+        # Channel names are fixed by the config; resolve the CSV order once
+        self._channel_names = sorted(self._data.keys())
 
         # Internal storage for recent samples: {channel: {"raw": deque, "voltage": deque, "gain": last_gain}}
         self._running = True
@@ -151,6 +242,11 @@ class ADCManager:
         self._running = False
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout)
+        if self.bus is not None:
+            try:
+                self.bus.close()
+            except Exception:
+                pass
 
     def read_all(self) -> Dict[str, float]:
         """Return averaged voltages per channel.
@@ -190,4 +286,4 @@ class ADCManager:
         return readings
 
     def get_channel_names(self) -> list[str]:
-        return sorted(self._data.keys())
\ No newline at end of file
+        return list(self._channel_names)
\ No newline at end of file
@@ -1,18 +1,32 @@
 import threading
 import time
 import os
-from datetime import datetime, timezone
+from collections import deque
 from pathlib import Path
 import logging
 
 from utils import (
-    apply_calibration,
+    compile_calibration,
     csv_writer,
     ensure_dir,
+    format_row,
+    fs_is_durable,
+    open_append_fd,
+    utc_timestamp,
+    write_all,
 )
 
 logger = logging.getLogger("collector")
 
+# Rows are flushed every sample but only fsynced this often (seconds); each
+# fsync on a USB stick costs tens of milliseconds and a flash erase cycle.
+FSYNC_INTERVAL_S = 30
+
+# Formatted rows wait in RAM for the CSV writer thread. While the USB stick is
+# gone they keep accumulating (oldest dropped first) until the file reopens.
+ROW_BUFFER_SIZE = 256
+ROW_BATCH_SIZE = 32
+
 
 class CollectorService:
     """
@@ -44,9 +58,20 @@ class CollectorService:
 
         self._running = False
         self._thread = None
+        self._writer_thread = None
+        self._rows = deque(maxlen=ROW_BUFFER_SIZE)
+        self._rows_lock = threading.Lock()
+        self._rows_ready = threading.Event()
 
         self.sampling_seconds = int(cfg.get("sampling_seconds", 60))
-        self.calibration = cfg.get("calibration", {})
+        self.calibration = cfg.get("calibration") or {}
+        storage_cfg = cfg.get("storage", {}) or {}
+        self.fsync_interval = float(storage_cfg.get("fsync_seconds", FSYNC_INTERVAL_S))
+        self._last_fsync = time.monotonic() - self.fsync_interval  # sync the first row
+        # storage.dsync: append rows through an O_DSYNC descriptor so each
+        # batch is on the stick when write() returns (no fsync window)
+        self.dsync = bool(storage_cfg.get("dsync", False))
+        self._data_fd = None
         # Device ID from config or env, used for file naming and IoT messages
         self.device_id = (
             cfg.get("device", {}).get("id")
@@ -55,13 +80,30 @@ class CollectorService:
         )
 
         ensure_dir(self.usb_mount)
+        # fsync on tmpfs/overlay (dev boxes without a USB stick) buys nothing
+        self._fs_durable = fs_is_durable(self.usb_mount)
+        if not self._fs_durable:
+            self.logger.info("%s is not on persistent storage; CSV fsync disabled", self.usb_mount)
 
         # Setup CSV
         self.adc_channels = adc_manager.get_channel_names()
+        # (channel, scale, offset) in CSV column order, so the loop does one
+        # multiply-add per channel instead of calibration dict lookups
+        cal = compile_calibration(self.calibration)
+        self._adc_columns = [
+            (channel,) + cal.get(channel, (1.0, 0.0))
+            for channel in self.adc_channels
+        ]
         self.header = self._create_headers()
-        self.file_handle, self.writer, self.csv_path = csv_writer(
-            self.usb_mount, self.device_id, self.header
-        )
+        # One row list reused every sample: timestamp, pulse counts, ADC values.
+        # It is formatted into a string straight away, so overwriting is safe.
+        self._adc_start = 1 + len(self.counters)
+        self._row = [None] * len(self.header)
+        self._open_csv()
+        # If the stick was mounted at startup, only reopen after an I/O error
+        # once something is mounted there again (a re-plugged stick may come
+        # back as a different device), never in the bare SD-card directory.
+        self._require_mount = os.path.ismount(self.usb_mount)
         self.logger.info("CollectorService initialized")
 
 
@@ -79,6 +121,8 @@ class CollectorService:
         if self._running:
             return
         self._running = True
+        self._writer_thread = threading.Thread(target=self._write_rows, daemon=True)
+        self._writer_thread.start()
         self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
 
@@ -88,59 +132,154 @@ class CollectorService:
         self._running = False
         if self._thread:
             self._thread.join(timeout=2)
+        # Wake the writer for a final drain; it exits once _running is False
+        self._rows_ready.set()
+        if self._writer_thread:
+            self._writer_thread.join(timeout=2)
 
-        try:
-            self.file_handle.close()
-        except Exception:
-            pass
+        if self.file_handle is not None:
+            try:
+                self.file_handle.flush()
+                if self._fs_durable:
+                    os.fsync(self.file_handle.fileno())
+            except Exception:
+                pass
+        self._close_csv()
+        if self._rows:
+            self.logger.warning("%d CSV row(s) not written at shutdown", len(self._rows))
 
         self.logger.info("CollectorService stopped")
 
     # -----------------------------------------------------
 
+    def _open_csv(self):
+        self.file_handle, self.writer, self.csv_path = csv_writer(
+            self.usb_mount, self.device_id, self.header, sync_header=self._fs_durable
+        )
+        if self.dsync:
+            # The header went through the text handle (and was fsynced);
+            # rows from here on use the raw descriptor only.
+            self.file_handle.close()
+            self.file_handle = None
+            self._data_fd = open_append_fd(self.csv_path)
+
+    def _csv_is_open(self) -> bool:
+        return self.file_handle is not None or self._data_fd is not None
+
+    def _close_csv(self):
+        if self.file_handle is not None:
+            try:
+                self.file_handle.close()
+            except Exception:
+                pass
+            self.file_handle = None
+        if self._data_fd is not None:
+            try:
+                os.close(self._data_fd)
+            except OSError:
+                pass
+            self._data_fd = None
+
+    def _write_batch(self, data: str):
+        if self._data_fd is not None:
+            write_all(self._data_fd, data.encode())
+            return
+        self.file_handle.write(data)
+        self.file_handle.flush()
+        if not self._fs_durable:
+            return
+        now = time.monotonic()
+        if now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self.file_handle.fileno())
+            self._last_fsync = now
+
+    def _reopen_csv(self) -> bool:
+        """Reopen the CSV after an I/O error, once the USB stick is mounted again."""
+        if self._require_mount and not os.path.ismount(self.usb_mount):
+            self.logger.warning("%s is not mounted, %d row(s) buffered", self.usb_mount, len(self._rows))
+            return False
+        try:
+            self._open_csv()
+        except OSError as exc:
+            self.logger.warning("CSV reopen in %s failed, %d row(s) buffered: %s", self.usb_mount, len(self._rows), exc)
+            return False
+        self.logger.info("CSV reopened at %s", self.csv_path)
+        return True
+
+    def _drain_rows(self):
+        """Write buffered rows in batches; on I/O errors keep them buffered."""
+        while True:
+            if not self._csv_is_open() and not self._reopen_csv():
+                return
+            with self._rows_lock:
+                batch = [self._rows.popleft() for _ in range(min(ROW_BATCH_SIZE, len(self._rows)))]
+            if not batch:
+                return
+            try:
+                self._write_batch("".join(batch))
+            except OSError:
+                self.logger.exception("CSV write to %s failed; buffering rows", self.csv_path)
+                with self._rows_lock:
+                    self._rows.extendleft(reversed(batch))
+                self._close_csv()
+                return
+
+    def _write_rows(self):
+        """CSV writer thread: drain the row buffer whenever the sampler adds to it."""
+        while True:
+            self._rows_ready.wait()
+            self._rows_ready.clear()
+            self._drain_rows()
+            if not self._running:
+                return
+
+    # -----------------------------------------------------
+
     def _run(self):
         # next_heartbeat = time.time() + 60
         # start_time = time.time()
 
+        # Absolute monotonic deadlines: loop work and sleep overshoot don't
+        # accumulate into drift, and NTP steps don't move the schedule.
+        next_deadline = time.monotonic()
         while self._running:
-            loop_started = time.time()
-
             try:
-                # Amber walklight while collecting data
-                self.ext_status_led.measuring()
-
-                #timestamp_utc = datetime.now(timezone.utc).isoformat()
-                timestamp_utc = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-                self.logger.info("Collecting data at %s", timestamp_utc)
+                # Take the sample first: pulse snapshots and ADC averages are
+                # both non-blocking, while the LED feedback below may wait up
+                # to 0.5 s for the previous ring animation to finish.
+                row = self._row
+                adc_start = self._adc_start
+                timestamp_utc = row[0] = utc_timestamp()
 
                 # Read out all pulse counters and reset for next interval
-                pulse_values = [
-                    counter.snapshot_and_reset()
-                    for _, counter in self.counters
-                ]
+                for i, (_, counter) in enumerate(self.counters, 1):
+                    row[i] = counter.snapshot_and_reset()
 
-                # Read ADC values, apply calibration, and prepare for CSV
+                # ADC values come from the ADCManager background sampler
                 adc_raw = self.adc_manager.read_all()
-                adc_calibrated = apply_calibration(adc_raw, self.calibration)
-                adc_values = [
-                    adc_calibrated.get(channel)
-                    for channel in self.adc_channels
-                ]
-
-                # Write CSV with last known values (even if ADC read failed)
-                self.writer.writerow(
-                    [timestamp_utc] + pulse_values + adc_values
-                )
-                self.file_handle.flush()
-                os.fsync(self.file_handle.fileno())
+
+                # Amber walklight while processing the sample
+                self.ext_status_led.measuring()
+                self.logger.info("Collecting data at %s", timestamp_utc)
+
+                # Apply calibration in CSV column order
+                for i, (channel, scale, offset) in enumerate(self._adc_columns, adc_start):
+                    v = adc_raw.get(channel)
+                    row[i] = None if v is None else v * scale + offset
+
+                # Queue CSV row with last known values (even if ADC read failed)
+                line = format_row(row)
+                with self._rows_lock:
+                    self._rows.append(line)
+                self._rows_ready.set()
 
                 # IoT send — show upload status on LEDs
                 if self.iot:
                     self.ext_status_led.uploading()
                     payload = {
                         "timestamp": timestamp_utc,
-                        "pulses": {name: val for (name, _), val in zip(self.counters, pulse_values)},
-                        "adc": dict(zip(self.adc_channels, adc_values)),
+                        "pulses": {name: val for (name, _), val in zip(self.counters, row[1:adc_start])},
+                        "adc": dict(zip(self.adc_channels, row[adc_start:])),
                     }
                     try:
                         self.iot.send("data", payload)
@@ -157,9 +296,11 @@ class CollectorService:
             except Exception:
                 self.logger.exception("Collector loop crashed")
 
-            # Sleep remaining interval
-            elapsed = time.time() - loop_started
-            sleep_duration = max(
-                0.0, self.sampling_seconds - elapsed
-            )
-            time.sleep(sleep_duration)
\ No newline at end of file
+            # Sleep until the next sample is due
+            next_deadline += self.sampling_seconds
+            sleep_for = next_deadline - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            else:
+                self.logger.warning("Sample overrun by %.3fs", -sleep_for)
+                next_deadline = time.monotonic()
\ No newline at end of file
@@ -6,6 +6,7 @@ Uses lgpio as primary backend, RPi.GPIO as fallback.
 """
 
 import logging
+import queue
 import threading
 import time
 from typing import Optional
@@ -32,9 +33,11 @@ class ExtStatusLED:
         self.enabled = enabled
         self.gpio_pin = gpio_pin
         self.backend = backend or _gpio_lib
-        self._lock = threading.Lock()
         self._handle = None
         self._gpio = None
+        # Blink patterns are played one after another by a single worker thread
+        self._queue: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._worker_thread: Optional[threading.Thread] = None
 
         if not self.enabled:
             logger.info("External LED disabled")
@@ -51,6 +54,10 @@ class ExtStatusLED:
         except Exception as exc:
             logger.warning("Failed to initialize LED on GPIO%d: %s", self.gpio_pin, exc)
             self.enabled = False
+            return
+
+        self._worker_thread = threading.Thread(target=self._worker, daemon=True)
+        self._worker_thread.start()
 
     def _init_gpio(self):
         """Initialize GPIO depending on backend."""
@@ -80,29 +87,44 @@ class ExtStatusLED:
             logger.debug("Failed to set GPIO%d: %s", self.gpio_pin, exc)
 
     def _blink(self, on_ms: int, off_ms: int, count: int = 1):
-        """Blink LED in a separate thread."""
+        """Blink LED; runs on the worker thread."""
         if not self.enabled:
             return
-        with self._lock:
-            for _ in range(count):
-                self._set_pin(1)
-                time.sleep(on_ms / 1000.0)
-                self._set_pin(0)
-                if off_ms > 0:
-                    time.sleep(off_ms / 1000.0)
+        for _ in range(count):
+            self._set_pin(1)
+            time.sleep(on_ms / 1000.0)
+            self._set_pin(0)
+            if off_ms > 0:
+                time.sleep(off_ms / 1000.0)
+
+    def _worker(self):
+        """Play queued blink patterns until a None sentinel arrives."""
+        while True:
+            pattern = self._queue.get()
+            if pattern is None:
+                return
+            self._blink(*pattern)
+
+    def _enqueue(self, on_ms: int, off_ms: int, count: int):
+        if self.enabled:
+            self._queue.put((on_ms, off_ms, count))
 
     # --- LED patterns ---
     def heartbeat(self):
-        threading.Thread(target=self._blink, args=(250, 0, 1), daemon=True).start()
+        self._enqueue(250, 0, 1)
 
     def error(self):
-        threading.Thread(target=self._blink, args=(100, 100, 3), daemon=True).start()
+        self._enqueue(100, 100, 3)
 
     def startup(self):
-        threading.Thread(target=self._blink, args=(500, 0, 1), daemon=True).start()
+        self._enqueue(500, 0, 1)
 
     def stop(self):
-        """Cleanup GPIO resources."""
+        """Stop the blink worker and cleanup GPIO resources."""
+        if self._worker_thread:
+            self._queue.put(None)
+            self._worker_thread.join(timeout=1.0)
+            self._worker_thread = None
         if not self.enabled:
             return
         try:
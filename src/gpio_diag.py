@@ -31,16 +31,19 @@ for chip_path in chips:
         print(f"Chip {chip_num}: open failed: {e}")
         continue
     print(f"Chip {chip_num}: opened")
+    # Probe every pin on the one open handle; gpio_free releases the line again
     for pin in pins:
         try:
             lgpio.gpio_claim_input(h, pin)
-            print(f"  Claim SUCCESS line {pin} on chip {chip_num}")
-            results.append((pin, chip_num))
-            # release for cleanliness
-            lgpio.gpiochip_close(h)
-            h = lgpio.gpiochip_open(chip_num)
         except Exception as e:
             print(f"  Claim fail line {pin} on chip {chip_num}: {e}")
+            continue
+        print(f"  Claim SUCCESS line {pin} on chip {chip_num}")
+        results.append((pin, chip_num))
+        try:
+            lgpio.gpio_free(h, pin)
+        except Exception as e:
+            print(f"  Release fail line {pin} on chip {chip_num}: {e}")
     lgpio.gpiochip_close(h)
 
 print("Summary:")
@@ -22,7 +22,10 @@ class MainWindow(QtWidgets.QMainWindow):
         # Resolve log file path from the logger's FileHandler if available
         self._logpath = None
         if logger:
-            for handler in logger.handlers:
+            # setup_logger() puts the FileHandler behind a QueueListener
+            listener = getattr(logger, "_listener", None)
+            handlers = list(logger.handlers) + list(getattr(listener, "handlers", ()))
+            for handler in handlers:
                 if isinstance(handler, logging.FileHandler):
                     self._logpath = Path(handler.baseFilename)
                     break
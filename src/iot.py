@@ -1,6 +1,8 @@
 import json
 import logging
-from datetime import datetime, timezone
+import queue
+import threading
+import time
 
 logger = logging.getLogger("iot")
 
@@ -10,17 +12,49 @@ except ImportError:  # handled gracefully when dependency missing
     IoTHubDeviceClient = None
     Message = None
 
+try:
+    import orjson
+except ImportError:  # stdlib json gives the same envelope, just slower
+    orjson = None
+
+
+def _dumps(obj) -> bytes:
+    """Serialise obj to UTF-8 JSON bytes (orjson when available)."""
+    if orjson is not None:
+        # Settings payloads come from YAML and may have non-str keys
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj).encode()
+
+# Messages waiting for the sender thread. When the queue is full the oldest
+# message is dropped, so a slow or offline hub never blocks the caller.
+QUEUE_SIZE = 256
+# Maximum number of queued messages the sender thread picks up per wake-up.
+BATCH_SIZE = 64
+
 
 class IoTHubSender:
     """Thin wrapper around IoT Hub device client with simple JSON envelope.
 
-    Envelope shape: {"type": str, "deviceId": str, "ts": iso8601, "payload": any}
+    Envelope shape: {"type": str, "deviceId": str, "ts": iso8601 UTC (seconds, Z), "payload": any}
+
+    send() only serialises and enqueues; a daemon thread does the blocking
+    send_message calls.
     """
 
     def __init__(self, connection_string: str, device_id: str):
         self.connection_string = connection_string
         self.device_id = device_id
         self.client = None
+        # Static part of the envelope is serialised once (same bytes as
+        # json.dumps of the full dict); send() only fills in the variable parts.
+        self._envelope = (
+            b'{"type": "%b", "deviceId": '
+            + json.dumps(device_id).encode()
+            + b', "ts": "%b", "payload": %b}'
+        )
+        self._ts_cache = (0, b"")
+        self._queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = None
 
     def start(self):
         if not IoTHubDeviceClient or not Message:
@@ -33,8 +67,16 @@ class IoTHubSender:
         except Exception as exc:
             logger.error("IoT Hub connectie faalde: %s", exc)
             self.client = None
+            return
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
 
     def stop(self):
+        if self._thread:
+            # Sentinel goes after any queued messages, so those are sent first
+            self._enqueue(None)
+            self._thread.join(timeout=5.0)
+            self._thread = None
         if self.client:
             try:
                 self.client.disconnect()
@@ -43,19 +85,65 @@ class IoTHubSender:
             logger.info("IoT Hub sessie afgesloten")
             self.client = None
 
-    def send(self, msg_type: str, payload):
-        if not self.client:
-            return
-        body = {
-            "type": msg_type,
-            "deviceId": self.device_id,
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "payload": payload,
-        }
+    def _timestamp(self) -> bytes:
+        """UTC timestamp with second resolution, re-formatted only when the second changes."""
+        sec = int(time.time())
+        cached_sec, cached = self._ts_cache
+        if sec != cached_sec:
+            cached = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(sec)).encode()
+            self._ts_cache = (sec, cached)
+        return cached
+
+    def _enqueue(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                logger.warning("IoT Hub wachtrij vol; oudste bericht (%s) verworpen", dropped[0] if dropped else None)
+
+    def _send_now(self, msg_type: str, body: bytes):
         try:
-            msg = Message(json.dumps(body))
+            msg = Message(body)
             msg.content_encoding = "utf-8"
             msg.content_type = "application/json"
             self.client.send_message(msg)
         except Exception as exc:
             logger.error("IoT Hub send faalde (%s): %s", msg_type, exc)
+            try:
+                self.client.connect()
+            except Exception as exc_conn:
+                logger.error("IoT Hub herverbinden faalde: %s", exc_conn)
+
+    def _drain(self):
+        """Sender thread: send queued messages in batches until the None sentinel."""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    return
+                self._send_now(*item)
+
+    def send(self, msg_type: str, payload):
+        """Serialise the envelope and queue it for the sender thread."""
+        if not self.client:
+            return
+        try:
+            body = self._envelope % (
+                msg_type.encode(),
+                self._timestamp(),
+                _dumps(payload),
+            )
+        except Exception as exc:
+            logger.error("IoT Hub send faalde (%s): %s", msg_type, exc)
+            return
+        self._enqueue((msg_type, body))
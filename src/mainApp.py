@@ -2,6 +2,7 @@ import os
 import sys
 from pathlib import Path
 from PyQt5 import QtWidgets
+from dotenv import load_dotenv
 
 from utils import load_config, setup_logger
 from version import __version__
@@ -15,6 +16,9 @@ from status_led_ring import StatusLedRing
 from collector_service import CollectorService
 from gui import MainWindow   # your GUI file
 
+# Load environment variables from .env file (before reading EDGE_CONFIG)
+load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+
 # -----------------------------
 # Configuration path
 # -----------------------------
@@ -69,8 +73,11 @@ def initialize_pulse_counters(pulse_configs, backend_order=None, logger=None):
         counter = PulseCounter(
             gpio=int(pulse_cfg["gpio"]),
             backend_order=backend_order,
-            pull_up=True,
-            falling=True,
+            pull_up=bool(pulse_cfg.get("pull_up", True)),
+            falling=str(pulse_cfg.get("edge", "falling")).lower() == "falling",
+            debounce_us=int(pulse_cfg.get("debounce_us", 2000)),
+            # opt-in: try gpiod (batched kernel edge events) before gpio_backends
+            batch_events=bool(pulse_cfg.get("batch_events", False)),
             logger = logger
         )
         counter.start()
@@ -1,68 +1,207 @@
 
+import itertools
 import threading
 import logging
 import os
+import time
 
 # logger = logging.getLogger("pulse")
 
+class _BackendRegistry:
+    """
+    Process-wide pigpio connection and lgpio chip handles shared by all
+    PulseCounters. The daemon probe runs once; each resource is refcounted
+    and closed when the last counter using it stops.
+    """
+    _lock = threading.Lock()
+    _pi = None
+    _pi_refs = 0
+    _pi_probed = False
+    _lgpio_handles = {}  # chip number -> [handle, refs]
+
+    @staticmethod
+    def _probe_pigpio(logger):
+        """Connect to the pigpio daemon; return the pi object or None."""
+        import pigpio, io, contextlib
+        # fast test if daemon responsive
+        with contextlib.redirect_stdout(io.StringIO()):
+            pi = pigpio.pi()
+        if not pi.connected:
+            pi.stop()
+            logger.debug("pigpio daemon not connected; skipping pigpio backend")
+            return None
+        # Basic heuristic: if hardware revision unknown skip silently
+        try:
+            rev = pigpio.get_hardware_revision()
+            if rev == 0:  # pigpio returns 0 if not a Pi
+                pi.stop()
+                logger.debug("pigpio hardware revision 0 (non-Pi); skipping pigpio backend")
+                return None
+        except Exception:
+            pass
+        return pi
+
+    @classmethod
+    def acquire_pigpio(cls, logger):
+        """Return the shared pigpio connection (probing on first use), or None."""
+        with cls._lock:
+            if cls._pi is None:
+                if cls._pi_probed:
+                    return None
+                cls._pi_probed = True
+                cls._pi = cls._probe_pigpio(logger)
+                if cls._pi is None:
+                    return None
+            cls._pi_refs += 1
+            return cls._pi
+
+    @classmethod
+    def release_pigpio(cls):
+        with cls._lock:
+            cls._pi_refs -= 1
+            if cls._pi_refs <= 0 and cls._pi is not None:
+                cls._pi.stop()
+                cls._pi = None
+                cls._pi_refs = 0
+                cls._pi_probed = False  # a later start() may reconnect
+
+    @classmethod
+    def acquire_lgpio(cls, chip_num):
+        """Return the shared lgpio handle for chip_num, opening it on first use."""
+        with cls._lock:
+            entry = cls._lgpio_handles.get(chip_num)
+            if entry is None:
+                import lgpio
+                entry = cls._lgpio_handles[chip_num] = [lgpio.gpiochip_open(chip_num), 0]
+            entry[1] += 1
+            return entry[0]
+
+    @classmethod
+    def release_lgpio(cls, chip_num):
+        with cls._lock:
+            entry = cls._lgpio_handles.get(chip_num)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del cls._lgpio_handles[chip_num]
+                import lgpio
+                lgpio.gpiochip_close(entry[0])
+
+
 class PulseCounter:
     """
     PulseCounter counts pulses on a GPIO pin using either pigpio or RPi.GPIO.
     For testing on non-Pi systems, hardware-specific code is commented out.
     """
-    def __init__(self, gpio, pull_up = True, falling = True, debounce_us = 2000, backend_order = None, logger = None):
+    def __init__(self, gpio, pull_up = True, falling = True, debounce_us = 2000, backend_order = None, logger = None, batch_events = False):
         """
         Initialize the pulse counter.
         gpio: GPIO pin number
         pull_up: Use pull-up resistor
         falling: Count falling edge (else rising)
         debounce_us: Debounce time in microseconds
+        batch_events: Opt in to trying the gpiod backend first, ahead of the
+            configured order; it counts kernel edge events in batches on a
+            worker thread instead of one Python callback per edge
         """
         self.gpio = gpio
         self.pull_up = pull_up
         self.falling = falling
         self.debounce_us = debounce_us
-        self.count = 0
-        self._lock = threading.Lock()
+        # Lock-free count: callbacks advance the C-level itertools.count
+        # (atomic under the GIL); snapshots are differences between readings.
+        # One cell per pin is enough: each backend dispatches callbacks from a
+        # single thread, so there is no cross-core contention to stripe away.
+        self._counter = itertools.count()
+        self._last = 0
+        # Level reported by pigpio/lgpio for the edge we count
+        self._want_level = 0 if falling else 1
         self._backend = None
         self._cb = None
         self.logger = logger or logging.getLogger("pulse")
         # Allow explicit backend order (list of strings) else defer to env var
         self._backend_order = backend_order
+        self.batch_events = batch_events
+        self._stop_event = threading.Event()
+        self._event_thread = None
 
-    def _cb_pigpio(self, gpio, level, tick):
+    def _cb_pigpio(self):
         """
-        Callback for pigpio backend.
-        Increments count on correct edge.
+        Build the callback for the pigpio backend.
+        Counter and wanted level are bound as closure locals, so each edge
+        costs one comparison and one C-level increment.
         """
-        if self.falling and level == 0 or (not self.falling and level == 1):
-            with self._lock:
-                self.count += 1
+        tick, want = self._counter.__next__, self._want_level
+
+        def _cb(gpio, level, _tick):
+            if level == want:
+                tick()
+        return _cb
 
     def _cb_rpi(self, channel):
         """
         Callback for RPi.GPIO backend.
         Increments count.
         """
-        with self._lock:
-            self.count += 1
+        next(self._counter)
 
-    def _cb_lgpio(self, chip, gpio, level, tick):
+    def _cb_lgpio(self):
         """
-        Callback for lgpio backend.
+        Build the callback for the lgpio backend (level 2 = watchdog, ignored).
+        The per-edge debug log is only wired in when DEBUG is enabled at start.
         """
-        if level in (0, 1):
-            if (
-                (self.falling and level == 0) 
-                or 
-                (not self.falling and level == 1)
-            ):
-                with self._lock:
-                    self.count += 1
+        tick, want = self._counter.__next__, self._want_level
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            def _cb(chip, gpio, level, _tick):
+                if level == want:
+                    tick()
+            return _cb
+
+        def _cb_debug(chip, gpio, level, _tick):
+            if level == want:
+                n = tick()
                 self.logger.debug(
                     "GPIO %s edge detected (lgpio) level=%s count=%s",
-                    gpio, level, self.count
+                    gpio, level, n + 1 - self._last
                 )
+        return _cb_debug
+
+    def _ordered_gpiochips(self):
+        """Return /dev/gpiochip* paths, with LGPIO_CHIP_PRIORITY chips first."""
+        import glob
+        chips = sorted(glob.glob('/dev/gpiochip*'))
+        priority = os.environ.get('LGPIO_CHIP_PRIORITY')
+        if priority:
+            try:
+                ordered = []
+                desired = [int(x.strip()) for x in priority.split(',') if x.strip()]
+                # map desired to paths
+                path_map = {int(p.replace('/dev/gpiochip','')): p for p in chips}
+                for num in desired:
+                    if num in path_map:
+                        ordered.append(path_map[num])
+                # append any remaining chips not listed
+                for p in chips:
+                    if p not in ordered:
+                        ordered.append(p)
+                chips = ordered
+                self.logger.debug("lgpio: chip priority applied -> %s", [c.replace('/dev/gpiochip','') for c in chips])
+            except Exception as e_prio:
+                self.logger.debug("lgpio: priority parse failed: %s", e_prio)
+        return chips
+
+    def _gpiod_worker(self, request):
+        """Wait on the line-event fd and count edges in batches."""
+        tick = self._counter.__next__
+        while not self._stop_event.is_set():
+            try:
+                if request.wait_edge_events(0.5):
+                    for _ in request.read_edge_events():
+                        tick()
+            except Exception as e:
+                self.logger.error("gpiod: event read failed on GPIO %s: %s", self.gpio, e)
+                return
 
     def start(self):
         """Start pulse counting, trying backends in priority order.
@@ -73,6 +212,8 @@ class PulseCounter:
         """
         backend_order = self._backend_order or os.environ.get("GPIO_BACKENDS", "pigpio,lgpio,rpi").split(',')
         skip_pigpio = os.environ.get("PULSE_SKIP_PIGPIO") == "1"
+        if self.batch_events:
+            backend_order = ["gpiod"] + [b for b in backend_order if b.strip() != "gpiod"]
 
         self.logger.info("PulseCounter init gpio=%s backends=%s skip_pigpio=%s", self.gpio, backend_order, skip_pigpio)
 
@@ -81,24 +222,12 @@ class PulseCounter:
                 if skip_pigpio:
                     self.logger.debug("Skipping pigpio due to PULSE_SKIP_PIGPIO=1")
                     continue
+                pi = None
                 try:
-                    import pigpio, io, contextlib, sys
-                    # fast test if daemon responsive
-                    with contextlib.redirect_stdout(io.StringIO()):
-                        pi = pigpio.pi()
-                    if not pi.connected:
-                        pi.stop()
-                        self.logger.debug("pigpio daemon not connected; skipping pigpio backend")
+                    import pigpio
+                    pi = _BackendRegistry.acquire_pigpio(self.logger)
+                    if pi is None:
                         continue
-                    # Basic heuristic: if hardware revision unknown skip silently
-                    try:
-                        rev = pigpio.get_hardware_revision()
-                        if rev == 0:  # pigpio returns 0 if not a Pi
-                            pi.stop()
-                            self.logger.debug("pigpio hardware revision 0 (non-Pi); skipping pigpio backend")
-                            continue
-                    except Exception:
-                        pass
                     self._backend = ("pigpio", pi)
                     pud = pigpio.PUD_UP if self.pull_up else pigpio.PUD_DOWN
                     pi.set_mode(self.gpio, pigpio.INPUT)
@@ -106,42 +235,59 @@ class PulseCounter:
                     edge = pigpio.FALLING_EDGE if self.falling else pigpio.RISING_EDGE
                     if self.debounce_us > 0:
                         pi.set_glitch_filter(self.gpio, self.debounce_us)
-                    self._cb = pi.callback(self.gpio, edge, self._cb_pigpio)
-                    logger.info(f"PulseCounter started on GPIO {self.gpio} using pigpio")
+                    self._cb = pi.callback(self.gpio, edge, self._cb_pigpio())
+                    self.logger.info("PulseCounter started on GPIO %s using pigpio", self.gpio)
                     return
                 except Exception as e:
-                    self.logger.debug(f"pigpio backend failed: {e}")
+                    self.logger.debug("pigpio backend failed: %s", e)
+                    if pi is not None:
+                        self._backend = None
+                        _BackendRegistry.release_pigpio()
                     continue
-            elif backend == "lgpio":
+            elif backend == "gpiod":
                 try:
-                    import glob, lgpio
-                    chips = sorted(glob.glob('/dev/gpiochip*'))
-                    priority = os.environ.get('LGPIO_CHIP_PRIORITY')
-                    if priority:
+                    from datetime import timedelta
+                    import gpiod
+                    from gpiod.line import Bias, Direction, Edge
+                    settings = gpiod.LineSettings(
+                        direction=Direction.INPUT,
+                        edge_detection=Edge.FALLING if self.falling else Edge.RISING,
+                        bias=Bias.PULL_UP if self.pull_up else Bias.PULL_DOWN,
+                        debounce_period=timedelta(microseconds=int(self.debounce_us)),
+                    )
+                    request = None
+                    for chip_path in self._ordered_gpiochips():
                         try:
-                            ordered = []
-                            desired = [int(x.strip()) for x in priority.split(',') if x.strip()]
-                            # map desired to paths
-                            path_map = {int(p.replace('/dev/gpiochip','')): p for p in chips}
-                            for num in desired:
-                                if num in path_map:
-                                    ordered.append(path_map[num])
-                            # append any remaining chips not listed
-                            for p in chips:
-                                if p not in ordered:
-                                    ordered.append(p)
-                            chips = ordered
-                            self.logger.debug(f"lgpio: chip priority applied -> {[c.replace('/dev/gpiochip','') for c in chips]}")
-                        except Exception as e_prio:
-                            self.logger.debug(f"lgpio: priority parse failed: {e_prio}")
+                            request = gpiod.request_lines(chip_path, consumer="pi-sensing", config={self.gpio: settings})
+                            break
+                        except Exception as e_chip:
+                            self.logger.debug("gpiod: %s claim failed for line %s: %s", chip_path, self.gpio, e_chip)
+                    if request is None:
+                        self.logger.debug("gpiod backend: no chip accepted line %s", self.gpio)
+                        continue
+                    self._backend = ("gpiod", request)
+                    self._stop_event.clear()
+                    self._event_thread = threading.Thread(target=self._gpiod_worker, args=(request,), daemon=True)
+                    self._event_thread.start()
+                    self.logger.info("PulseCounter started on GPIO %s using gpiod (%s, batched events)", self.gpio, chip_path)
+                    return
+                except Exception as e:
+                    self.logger.debug("gpiod backend failed: %s", e)
+                    continue
+            elif backend == "lgpio":
+                try:
+                    import lgpio
+                    chips = self._ordered_gpiochips()
                     if not chips:
                         self.logger.debug("lgpio: no gpiochip devices present")
                         continue
                     claimed = False
                     for chip_path in chips:
                         chip_num = int(chip_path.replace('/dev/gpiochip',''))
+                        h = None
                         try:
-                            h = lgpio.gpiochip_open(chip_num)
+                            # Chip handle shared with the other counters on this chip
+                            h = _BackendRegistry.acquire_lgpio(chip_num)
                             flags = lgpio.SET_PULL_UP if self.pull_up else lgpio.SET_PULL_DOWN
                             edge = lgpio.FALLING_EDGE if self.falling else lgpio.RISING_EDGE
 
@@ -154,7 +300,7 @@ class PulseCounter:
                             # free pin if program previously crashed while claiming it, then try claiming again
                             try:
                                 lgpio.gpio_claim_output(h, self.gpio)  # try claiming as output to free if needed
-                                lgpio.gpio_release(h, self.gpio)
+                                lgpio.gpio_free(h, self.gpio)
                             except Exception:
                                 pass
 
@@ -168,25 +314,27 @@ class PulseCounter:
                                     time.sleep(0.2)
 
                             lgpio.gpio_set_debounce_micros(h, self.gpio, int(self.debounce_us))
-                            self._cb = lgpio.callback(h, self.gpio, edge, self._cb_lgpio)
-                            self._backend = ("lgpio", (h,))
-                            self.logger.info(f"PulseCounter started on GPIO {self.gpio} using lgpio (chip {chip_num})")
+                            self._cb = lgpio.callback(h, self.gpio, edge, self._cb_lgpio())
+                            self._backend = ("lgpio", (h, chip_num))
+                            self.logger.info("PulseCounter started on GPIO %s using lgpio (chip %s)", self.gpio, chip_num)
                             claimed = True
                             break
                         except Exception as e_chip:
-                            self.logger.error(f"lgpio: chip {chip_num} claim failed for line {self.gpio}: {e_chip}")
-                            try:
-                                lgpio.gpiochip_close(h)
-                            except Exception:
-                                pass
+                            self.logger.error("lgpio: chip %s claim failed for line %s: %s", chip_num, self.gpio, e_chip)
+                            if h is not None:
+                                try:
+                                    lgpio.gpio_free(h, self.gpio)
+                                except Exception:
+                                    pass
+                                _BackendRegistry.release_lgpio(chip_num)
                             continue
                     if claimed:
                         return
                     else:
-                        self.logger.debug(f"lgpio backend: no chip accepted line {self.gpio}")
+                        self.logger.debug("lgpio backend: no chip accepted line %s", self.gpio)
                         continue
                 except Exception as e:
-                    self.logger.debug(f"lgpio backend failed: {e}")
+                    self.logger.debug("lgpio backend failed: %s", e)
                     continue
             elif backend == "rpi":
                 try:
@@ -198,23 +346,25 @@ class PulseCounter:
                     btime = max(1, int(self.debounce_us / 1000))
                     edge = GPIO.FALLING if self.falling else GPIO.RISING
                     GPIO.add_event_detect(self.gpio, edge, callback=self._cb_rpi, bouncetime=btime)
-                    self.logger.info(f"PulseCounter started on GPIO {self.gpio} using RPi.GPIO")
+                    self.logger.info("PulseCounter started on GPIO %s using RPi.GPIO", self.gpio)
                     return
                 except Exception as e:
-                    self.logger.debug(f"RPi.GPIO backend failed: {e}")
+                    self.logger.debug("RPi.GPIO backend failed: %s", e)
                     continue
 
-        self.logger.error(f"Failed to initialize any GPIO backend for GPIO {self.gpio}; pulse counting disabled")
+        self.logger.error("Failed to initialize any GPIO backend for GPIO %s; pulse counting disabled", self.gpio)
 
     def snapshot_and_reset(self):
         """
-        Return the current count and reset to zero.
+        Return the number of pulses since the previous snapshot.
+        Only one thread may take snapshots; callbacks never block on it.
         """
-        with self._lock:
-            self.logger.info(f"GPIO {self.gpio} pulse count snapshot: {self.count}")
-            c = self.count
-            self.count = 0
-            return c
+        # The probe itself consumes one counter value, hence the +1
+        cur = next(self._counter)
+        c = cur - self._last
+        self._last = cur + 1
+        self.logger.info("GPIO %s pulse count snapshot: %s", self.gpio, c)
+        return c
 
     def stop(self):
         """
@@ -223,11 +373,21 @@ class PulseCounter:
         if not self._backend:
             return
         name, b = self._backend
+        self._backend = None  # shared handles are refcounted; release only once
         if name == "pigpio":
             if self._cb:
                 self._cb.cancel()
-            b.stop()
-            self.logger.info(f"PulseCounter on GPIO {self.gpio} stopped (pigpio)")
+            _BackendRegistry.release_pigpio()
+            self.logger.info("PulseCounter on GPIO %s stopped (pigpio)", self.gpio)
+        elif name == "gpiod":
+            self._stop_event.set()
+            if self._event_thread:
+                self._event_thread.join(timeout=1.0)
+            try:
+                b.release()
+            except Exception as e:
+                self.logger.debug("gpiod cleanup failed: %s", e)
+            self.logger.info("PulseCounter on GPIO %s stopped (gpiod)", self.gpio)
         elif name == "lgpio":
             try:
                 import lgpio
@@ -236,12 +396,17 @@ class PulseCounter:
                         self._cb.cancel()
                     except Exception:
                         pass
-                h = b[0]
-                lgpio.gpiochip_close(h)
-                self.logger.info(f"PulseCounter on GPIO {self.gpio} stopped (lgpio)")
+                h, chip_num = b
+                try:
+                    lgpio.gpio_free(h, self.gpio)
+                except Exception:
+                    pass
+                # Chip handle is closed once the last counter on it stops
+                _BackendRegistry.release_lgpio(chip_num)
+                self.logger.info("PulseCounter on GPIO %s stopped (lgpio)", self.gpio)
             except Exception as e:
-                self.logger.debug(f"lgpio cleanup failed: {e}")
+                self.logger.debug("lgpio cleanup failed: %s", e)
         else:
             import RPi.GPIO as GPIO
             GPIO.cleanup(self.gpio)
-            self.logger.info(f"PulseCounter on GPIO {self.gpio} stopped (RPi.GPIO)")
\ No newline at end of file
+            self.logger.info("PulseCounter on GPIO %s stopped (RPi.GPIO)", self.gpio)
\ No newline at end of file
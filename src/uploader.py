@@ -1,8 +1,14 @@
 
+import gzip
+import io
+import logging
+import mmap
 import os
+import stat
 import sys
 import time
 import argparse
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime, timezone
 from urllib.parse import quote
@@ -10,21 +16,65 @@ from urllib.parse import urlparse
 
 from utils import setup_logger, load_config
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
-logger = setup_logger("uploader", logfile="uploader.log")
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import BlobServiceClient, ContentSettings
+# Configured by main(); importing this module has no side effects.
+logger = logging.getLogger("uploader")
 
-# Load environment variables from .env file
 ROOT_DIR = Path(__file__).resolve().parent.parent
-load_dotenv(dotenv_path=ROOT_DIR / ".env")
 
-# Configuration from environment variables
-CONFIG_PATH = os.environ.get("EDGE_CONFIG", str(ROOT_DIR / "config.yaml"))
-USB_MOUNT = Path(os.environ.get("USB_MOUNT", "/mnt/usb-data"))
-CONTAINER = os.environ.get("AZURE_BLOB_CONTAINER", "stable-sensing")
+# Files above BLOCK_SIZE are sent as staged blocks, UPLOAD_CONCURRENCY at a
+# time, instead of one sequential PUT (SDK default threshold is 64 MiB).
+BLOCK_SIZE = 4 * 1024 * 1024
+UPLOAD_CONCURRENCY = 4
+GZIP_LEVEL = 6
 
-# These are resolved at runtime from config/environment
-ACTIVE_PREFIX = os.environ.get("AZURE_BLOB_PREFIX", "").strip("/")
-ACTIVE_DEVICE_ID = os.environ.get("DEVICE_ID", "pi-node-01")
+
+def _env(name: str, default: str = "") -> str:
+    return os.environ.get(name, default).strip().strip('"').strip("'")
+
+
+@dataclass(frozen=True)
+class UploaderConfig:
+    """
+    Uploader settings, resolved once by main() from the environment and config.yaml.
+    """
+    usb_mount: Path
+    container: str
+    prefix: str = ""
+    device_id: str = "pi-node-01"
+    upload_minutes: int = 5
+    connection_string: str = ""
+    account_url: str = ""
+    sas_token: str = ""
+
+    @classmethod
+    def from_env(cls, cfg: dict) -> "UploaderConfig":
+        device_cfg = cfg.get("device", {}) if isinstance(cfg, dict) else {}
+        site = str(device_cfg.get("site", "")).strip()
+        location = str(device_cfg.get("location", "")).strip()
+        cfg_device_id = str(device_cfg.get("id", "")).strip() or None
+
+        # Resolve prefix: env overrides, else site/location from config
+        if os.environ.get("AZURE_BLOB_PREFIX"):
+            prefix = os.environ.get("AZURE_BLOB_PREFIX", "").strip("/")
+        else:
+            prefix = "/".join(p for p in [site, location] if p)
+
+        upload_minutes = int(cfg.get("upload_minutes", 5)) if isinstance(cfg, dict) else 5
+        if upload_minutes <= 0:
+            upload_minutes = 5
+
+        return cls(
+            usb_mount=Path(os.environ.get("USB_MOUNT", "/mnt/usb-data")),
+            container=_env("AZURE_BLOB_CONTAINER", "stable-sensing"),
+            prefix=prefix,
+            device_id=os.environ.get("DEVICE_ID", cfg_device_id or "pi-node-01"),
+            upload_minutes=upload_minutes,
+            connection_string=_env("AZURE_STORAGE_CONNECTION_STRING"),
+            account_url=_env("AZURE_STORAGE_ACCOUNT_URL"),
+            sas_token=_env("AZURE_STORAGE_SAS_TOKEN"),
+        )
 
 
 def _looks_like_valid_account_name(name: str) -> bool:
@@ -41,13 +91,13 @@ def _parse_connection_string(conn_str: str) -> dict:
         parts[k.strip()] = v.strip().strip('"').strip("'")
     return parts
 
-def _client():
+def _client(cfg: UploaderConfig):
     """
     Create and return an Azure BlobServiceClient using connection string or account URL + SAS token.
     """
-    conn_str = os.environ.get("AZURE_STORAGE_CONNECTION_STRING", "").strip().strip('"').strip("'")
-    acct_url = os.environ.get("AZURE_STORAGE_ACCOUNT_URL", "").strip().strip('"').strip("'")
-    sas = os.environ.get("AZURE_STORAGE_SAS_TOKEN", "").strip().strip('"').strip("'")
+    conn_str = cfg.connection_string
+    acct_url = cfg.account_url
+    sas = cfg.sas_token
     
     if conn_str:
         parts = _parse_connection_string(conn_str)
@@ -61,7 +111,9 @@ def _client():
         if not endpoint_suffix:
             raise RuntimeError("Missing EndpointSuffix in AZURE_STORAGE_CONNECTION_STRING")
         logger.info("Using connection string auth (account=%s, endpoint=%s)", account_name, endpoint_suffix)
-        return BlobServiceClient.from_connection_string(conn_str)
+        return BlobServiceClient.from_connection_string(
+            conn_str, max_single_put_size=BLOCK_SIZE, max_block_size=BLOCK_SIZE
+        )
 
     if acct_url and sas:
         parsed = urlparse(acct_url)
@@ -78,79 +130,211 @@ def _client():
                 f"({account_name!r}). Expected 3-24 lowercase letters/numbers."
             )
         logger.info("Using account URL + SAS auth (host=%s)", host)
-        return BlobServiceClient(account_url=acct_url, credential=sas)
+        return BlobServiceClient(
+            account_url=acct_url, credential=sas,
+            max_single_put_size=BLOCK_SIZE, max_block_size=BLOCK_SIZE,
+        )
 
     raise RuntimeError("No Azure credentials given.")
 
-def list_candidates():
+# Container client built on first use and reused across upload cycles;
+# dropped after a failed cycle so the next one reconnects.
+_CACHED_CONT = None
+# Set once the container is known to exist; a reconnect doesn't probe again.
+_CONTAINER_READY = False
+
+def _get_container(cfg: UploaderConfig):
     """
-    List all CSV files in the USB mount directory.
+    Return the (cached) container client, creating the container once.
     """
-    files = sorted(USB_MOUNT.glob("*.csv"))
-    logger.info("Found %d csv candidates in %s", len(files), USB_MOUNT)
+    global _CACHED_CONT, _CONTAINER_READY
+    if _CACHED_CONT is None:
+        container = cfg.container
+        if not container or "/" in container or " " in container:
+            raise RuntimeError(
+                "Invalid AZURE_BLOB_CONTAINER value. Container name must not contain spaces or '/'."
+            )
+        cont = _client(cfg).get_container_client(container)
+        if not _CONTAINER_READY:
+            try:
+                cont.create_container()
+                _CONTAINER_READY = True
+            except ResourceExistsError:
+                _CONTAINER_READY = True
+            except Exception as e:
+                # Not fatal: uploads fail loudly if it really is missing
+                logger.debug("create_container failed, retrying next cycle: %s", e)
+        _CACHED_CONT = cont
+    return _CACHED_CONT
+
+# Sorted CSV names from the last directory scan, reused while the directory
+# itself is unchanged (no file created, renamed or removed since).
+_LISTING_CACHE = {"key": None, "names": []}
+# Directory mtimes this recent aren't trusted as a cache key: FAT-formatted
+# sticks store them with 2 s resolution, so a file created right after the
+# scan could leave the mtime unchanged.
+_DIR_MTIME_SLACK_NS = 2_000_000_000
+
+def _csv_names(usb_mount: Path):
+    """
+    Return the sorted *.csv names in usb_mount, rescanning only when the
+    directory's inode or mtime changed.
+    """
+    st = os.stat(usb_mount)
+    key = (str(usb_mount), st.st_ino, st.st_mtime_ns)
+    if key != _LISTING_CACHE["key"]:
+        with os.scandir(usb_mount) as it:
+            names = sorted(e.name for e in it if e.name.endswith(".csv"))
+        settled = time.time_ns() - st.st_mtime_ns > _DIR_MTIME_SLACK_NS
+        _LISTING_CACHE.update(key=key if settled else None, names=names)
+    return _LISTING_CACHE["names"]
+
+def list_candidates(usb_mount: Path):
+    """
+    List all CSV files in the USB mount directory, sorted by name.
+    Returns (path, mtime_ns) tuples; the directory is only re-read when it changed.
+    """
+    files = []
+    for name in _csv_names(usb_mount):
+        path = usb_mount / name
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            continue  # removed since the scan
+        if stat.S_ISREG(st.st_mode):
+            files.append((path, st.st_mtime_ns))
+    logger.info("Found %d csv candidates in %s", len(files), usb_mount)
     return files
 
-def target_blob_path(local):
+def remove_legacy_markers(usb_mount: Path):
     """
-    Build the blob path in Azure using prefix, device ID, and local filename.
-    Uses the UTC date so each run in a day overwrites the same blob.
-    URL-encodes each path segment to handle spaces and special characters.
+    Delete the *.csv.ok sidecar files older versions wrote after each upload;
+    upload state now lives in blob metadata. Returns the number removed.
+    """
+    removed = 0
+    with os.scandir(usb_mount) as it:
+        for e in it:
+            if e.name.endswith(".csv.ok") and e.is_file(follow_symlinks=False):
+                try:
+                    os.unlink(e.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    if removed:
+        logger.info("Removed %d legacy .ok marker(s) from %s", removed, usb_mount)
+    return removed
+
+def blob_prefix(cfg: UploaderConfig):
+    """
+    URL-encoded "<prefix>/<device>" directory that all of this device's blobs live in.
     """
-    date_utc = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    stamped = f"{date_utc}{local.suffix}"
-    
     # URL-encode prefix if present (handles spaces in site/location from config)
-    if ACTIVE_PREFIX:
+    if cfg.prefix:
         # Split prefix by "/" and encode each segment
-        prefix_parts = [quote(p, safe="") for p in ACTIVE_PREFIX.split("/")]
+        prefix_parts = [quote(p, safe="") for p in cfg.prefix.split("/")]
         prefix_encoded = "/".join(prefix_parts)
     else:
         prefix_encoded = ""
     
-    device_encoded = quote(ACTIVE_DEVICE_ID, safe="")
+    device_encoded = quote(cfg.device_id, safe="")
+    return "/".join(p for p in [prefix_encoded, device_encoded] if p)
+
+def target_blob_path(cfg: UploaderConfig, local, date_str=None):
+    """
+    Build the blob path in Azure using prefix, device ID, and local filename.
+    Uses the UTC date so each run in a day overwrites the same blob.
+    Blobs are stored gzip-compressed, so the name ends in .gz.
+    URL-encodes each path segment to handle spaces and special characters.
+    date_str: precomputed YYYY-MM-DD; defaults to today's UTC date.
+    """
+    date_utc = date_str or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    stamped = f"{date_utc}{local.suffix}.gz"
     stamped_encoded = quote(stamped, safe=".")  # Keep . for file extension
-    
-    parts = [p for p in [prefix_encoded, device_encoded, stamped_encoded] if p]
-    return "/".join(parts)
+    return "/".join(p for p in [blob_prefix(cfg), stamped_encoded] if p)
 
-def upload_once():
+def upload_once(cfg: UploaderConfig):
     """
-    Upload all new CSV files to Azure Blob Storage and mark them as uploaded with a .ok file.
+    Upload all new or changed CSV files to Azure Blob Storage.
     """
-    container = CONTAINER.strip().strip('"').strip("'")
-    if not container or "/" in container or " " in container:
-        raise RuntimeError(
-            "Invalid AZURE_BLOB_CONTAINER value. Container name must not contain spaces or '/'."
-        )
-    cli = _client()
-    cont = cli.get_container_client(container)
+    global _CACHED_CONT
+    cont = _get_container(cfg)
     try:
-        cont.create_container()
+        return _upload_pending(cont, cfg)
     except Exception:
-        pass  # Container may already exist
+        _CACHED_CONT = None
+        raise
+
+def _uploaded_sources(cont, cfg: UploaderConfig):
+    """
+    Map source file name -> newest source mtime_ns uploaded for it, across all
+    of this device's blobs, from one server-side listing. Blobs are named by
+    upload date, so the source file (not the blob name) identifies the data.
+    """
+    prefix = blob_prefix(cfg)
+    out = {}
+    for b in cont.list_blobs(name_starts_with=prefix + "/" if prefix else None, include=["metadata"]):
+        meta = b.metadata or {}
+        name = meta.get("source_name")
+        try:
+            mtime_ns = int(meta.get("source_mtime_ns", ""))
+        except ValueError:
+            continue  # uploaded before metadata was recorded
+        if name and mtime_ns > out.get(name, -1):
+            out[name] = mtime_ns
+    return out
+
+def _upload_one(cont, f, target, mtime_ns):
+    """
+    Gzip one CSV and upload it to target, recording its name and mtime.
+    """
+    logger.info("Uploading %s -> %s", f, target)
+    # Sensor CSVs compress 5-10x; the uplink is the bottleneck, not the CPU
+    buf = io.BytesIO()
+    with open(f, "rb") as src, gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=GZIP_LEVEL) as gz:
+        # Compress straight from the page cache; no Python-level read buffers
+        if os.fstat(src.fileno()).st_size:  # mmap can't map an empty file
+            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                gz.write(mm)
+    size = buf.tell()
+    buf.seek(0)
+    cont.upload_blob(
+        name=target,
+        data=buf,
+        length=size,
+        overwrite=True,
+        max_concurrency=UPLOAD_CONCURRENCY,
+        blob_type="BlockBlob",
+        content_settings=ContentSettings(content_type="text/csv", content_encoding="gzip"),
+        metadata={"source_name": f.name, "source_mtime_ns": str(mtime_ns)},
+    )
+    logger.info("Uploaded %s to Azure as %s", f, target)
+
+def _upload_pending(cont, cfg: UploaderConfig):
+    """
+    Upload every CSV that changed since it was last uploaded; return the count.
+    """
+    # One clock reading per cycle for all blob names
+    date_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    # Files sharing a blob name overwrite each other in listing order, so only
+    # the last one decides what the blob should contain.
+    by_target = {}
+    for f, mtime_ns in list_candidates(cfg.usb_mount):
+        by_target[target_blob_path(cfg, f, date_str)] = (f, mtime_ns)
+
+    remote = _uploaded_sources(cont, cfg) if by_target else {}
+    pending = []
+    for target, (f, mtime_ns) in by_target.items():
+        if mtime_ns <= remote.get(f.name, -1):
+            logger.debug("Skip %s (unchanged since last upload)", f)
+            continue
+        pending.append((f, target, mtime_ns))
+
     uploaded = 0
-    for f in list_candidates():
-        ok = f.with_suffix(f.suffix + ".ok")
-        # If marker exists, re-upload only if file changed since marker was written
-        if ok.exists():
-            try:
-                if f.stat().st_mtime <= ok.stat().st_mtime:
-                    logger.debug("Skip %s (ok marker newer or same mtime)", f)
-                    continue
-                else:
-                    logger.info("Re-uploading %s (file newer than ok)", f)
-            except FileNotFoundError:
-                # If one of them disappeared in between, just proceed to upload
-                logger.debug("Stat race for %s or %s; proceeding to upload", f, ok)
-        target = target_blob_path(f)
-        logger.info("Uploading %s -> %s", f, target)
-        with open(f, "rb") as fh:
-            cont.upload_blob(name=target, data=fh, overwrite=True)
-        ok.write_text(datetime.now(timezone.utc).isoformat())
+    for f, target, mtime_ns in pending:
+        _upload_one(cont, f, target, mtime_ns)
         uploaded += 1
-        logger.info(f"Uploaded {f} to Azure as {target}")
     if uploaded:
-        logger.info(f"Total files uploaded: {uploaded}")
+        logger.info("Total files uploaded: %d", uploaded)
     return uploaded
 
 def main():
@@ -160,53 +344,55 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--once", action="store_true")
     args = ap.parse_args()
-    cfg = {}
-    try:
-        cfg = load_config(CONFIG_PATH)
-    except Exception as e:
-        logger.warning(f"Could not load config {CONFIG_PATH}: {e}; using defaults")
 
-    device_cfg = cfg.get("device", {}) if isinstance(cfg, dict) else {}
-    site = str(device_cfg.get("site", "")).strip()
-    location = str(device_cfg.get("location", "")).strip()
-    cfg_device_id = str(device_cfg.get("id", "")).strip() or None
-
-    # Resolve prefix: env overrides, else site/location from config
-    global ACTIVE_PREFIX, ACTIVE_DEVICE_ID
-    if os.environ.get("AZURE_BLOB_PREFIX"):
-        ACTIVE_PREFIX = os.environ.get("AZURE_BLOB_PREFIX", "").strip("/")
-    else:
-        parts = [p for p in [site, location] if p]
-        ACTIVE_PREFIX = "/".join(parts)
+    setup_logger("uploader", logfile="uploader.log")
+    # Load environment variables from .env file
+    load_dotenv(dotenv_path=ROOT_DIR / ".env")
 
-    ACTIVE_DEVICE_ID = os.environ.get("DEVICE_ID", cfg_device_id or "pi-node-01")
+    config_path = os.environ.get("EDGE_CONFIG", str(ROOT_DIR / "config.yaml"))
+    file_cfg = {}
+    try:
+        file_cfg = load_config(config_path)
+    except Exception as e:
+        logger.warning("Could not load config %s: %s; using defaults", config_path, e)
+    cfg = UploaderConfig.from_env(file_cfg)
+    upload_minutes = cfg.upload_minutes
 
-    upload_minutes = int(cfg.get("upload_minutes", 5)) if isinstance(cfg, dict) else 5
-    if upload_minutes <= 0:
-        upload_minutes = 5
+    try:
+        remove_legacy_markers(cfg.usb_mount)
+    except OSError as e:
+        logger.warning("Could not clean up .ok markers in %s: %s", cfg.usb_mount, e)
 
     if args.once:
-        uploaded = upload_once()
+        uploaded = upload_once(cfg)
         print(f"Uploaded {uploaded} files.")
-        logger.info(f"Uploader ran once, uploaded {uploaded} files.")
+        logger.info("Uploader ran once, uploaded %d files.", uploaded)
         return
     logger.info(
         "Starting continuous upload loop, interval=%d minutes, prefix=%s, device_id=%s",
         upload_minutes,
-        ACTIVE_PREFIX or "(none)",
-        ACTIVE_DEVICE_ID,
+        cfg.prefix or "(none)",
+        cfg.device_id,
     )
+    # Absolute monotonic deadlines: no drift from upload time, and NTP steps
+    # of the wall clock don't shorten or skip a cycle.
+    interval = upload_minutes * 60
+    next_deadline = time.monotonic()
     while True:
-        loop_started = time.time()
         try:
-            upload_once()
+            upload_once(cfg)
         except Exception as e:
             logger.exception("Upload error: %s", e)
             print(f"Upload error: {e}", file=sys.stderr)
             
-        elapsed = time.time() - loop_started
-        sleep_sec = max(0, upload_minutes * 60 - elapsed)
-        time.sleep(sleep_sec)
+        next_deadline += interval
+        sleep_sec = next_deadline - time.monotonic()
+        if sleep_sec > 0:
+            time.sleep(sleep_sec)
+        else:
+            # Upload took longer than the interval; start over from now
+            # instead of running back-to-back catch-up cycles.
+            next_deadline = time.monotonic()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
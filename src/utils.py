@@ -5,12 +5,13 @@ import sys
 import time
 import csv
 import yaml
+import atexit
+import copy
+import functools
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 # -----------------------------
 # load the configuration from a YAML file, with environment variable expansion
@@ -18,10 +19,15 @@ load_dotenv()
 def load_config(p):
     """
     Load YAML configuration file and expand environment variables in values.
+    The parsed result is cached until the file's mtime changes; each caller
+    gets its own copy.
     """
+    return copy.deepcopy(_load_config_cached(str(p), os.path.getmtime(p)))
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(p, mtime):
     with open(p) as f:
-        import yaml as y
-        cfg = y.safe_load(f)
+        cfg = yaml.safe_load(f)
     def exp(v):
         if isinstance(v, str):
             return os.path.expandvars(v)
@@ -41,6 +47,9 @@ def setup_logger(name = "edge", level = logging.INFO, logfile = None):
     """
     Set up a logger with UTC timestamps, stream output, and optional file logging.
     logfile: If provided, logs will also be written to this file.
+    Console and file output are written by a QueueListener thread, so logging
+    from GPIO callbacks never blocks on the terminal or the USB stick. The
+    listener is available as logger._listener and stopped at exit.
     """
     logger = logging.getLogger(name)
     logger.setLevel(level)
@@ -49,18 +58,35 @@ def setup_logger(name = "edge", level = logging.INFO, logfile = None):
     # Console handler
     stream_handler = logging.StreamHandler(sys.stdout)
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+    handlers = [stream_handler]
     
     # File handler
     if logfile:
         file_handler = logging.FileHandler(logfile)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # drains queued records before exit
+    logger._listener = listener
 
     logging.Formatter.converter = time.gmtime
 
     return logger
 
+# -----------------------------
+# Format the current UTC time without building datetime/tzinfo objects
+# -----------------------------
+def utc_timestamp(ts: float | None = None) -> str:
+    """
+    Return a UTC timestamp as YYYY-MM-DDTHH:MM:SSZ.
+    ts: seconds since the epoch; defaults to now.
+    """
+    return "%04d-%02d-%02dT%02d:%02d:%02dZ" % time.gmtime(time.time() if ts is None else ts)[:6]
+
 # -----------------------------
 # Check if directory is there, otherwise create it
 # -----------------------------
@@ -70,31 +96,109 @@ def ensure_dir(p: Path):
     """
     p.mkdir(parents=True, exist_ok=True)
 
+# -----------------------------
+# Tell whether fsync on a path actually reaches persistent storage
+# -----------------------------
+VOLATILE_FS_TYPES = {"tmpfs", "ramfs", "overlay"}
+
+def fs_is_durable(p: Path) -> bool:
+    """
+    Return False when p lives on a RAM-backed filesystem (per /proc/mounts,
+    longest matching mount point wins), where fsync is only overhead.
+    Defaults to True when the mount table cannot be read.
+    """
+    target = os.path.realpath(p)
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Mount points escape spaces as \040
+                mnt = fields[1].replace("\\040", " ")
+                prefix = mnt.rstrip("/") + "/"
+                if (target == mnt or target.startswith(prefix)) and len(mnt) >= len(best):
+                    best, fstype = mnt, fields[2]
+    except OSError:
+        return True
+    return fstype not in VOLATILE_FS_TYPES
+
 # -----------------------------
 # Create a csv writer for the given device and header, returning file handle, writer, and path
 # -----------------------------
-def csv_writer(root: Path, device_id: str, header):
+def csv_writer(root: Path, device_id: str, header, buffering: int = 1 << 16, sync_header: bool = True):
     """
     Open a CSV file for appending, write header if new, and return file handle and writer.
+    buffering: size of the write buffer; rows reach the disk on flush().
+    sync_header: fsync a newly written header; pass False where fsync is
+        pointless (RAM-backed filesystems) and the header is flushed only.
     """
     date_str = datetime.now(timezone.utc).date().isoformat()
     fpath = root / f"{date_str}_{device_id}.csv"
     is_new = not fpath.exists()
-    f = open(fpath, "a", newline="")
+    f = open(fpath, "a", newline="", buffering=buffering)
     w = csv.writer(f)
     if is_new:
         w.writerow(header)
         f.flush()
-        os.fsync(f.fileno())
+        if sync_header:
+            os.fsync(f.fileno())
 
     return f, w, fpath
 
+# -----------------------------
+# Open a raw append-only descriptor for durable CSV writes
+# -----------------------------
+def open_append_fd(fpath: Path, dsync: bool = True) -> int:
+    """
+    Open fpath for appending with os.open and return the file descriptor.
+    With dsync every os.write() returns only once the data is on the device,
+    so no separate flush()/fsync() is needed. Falls back to plain O_APPEND
+    where the platform has no O_DSYNC.
+    """
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+    if dsync:
+        flags |= getattr(os, "O_DSYNC", 0)
+    return os.open(fpath, flags, 0o644)
+
+def write_all(fd: int, data: bytes):
+    """os.write() until every byte of data has been written."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+# -----------------------------
+# Format a numeric CSV row without going through csv.writer
+# -----------------------------
+def format_row(values) -> str:
+    """
+    Return one CSV line identical to csv.writer's output for plain numbers and
+    timestamps (no commas, quotes or newlines in any cell). None becomes empty.
+    """
+    return ",".join(["" if v is None else str(v) for v in values]) + "\r\n"
+
+# -----------------------------
+# Turn the calibration config into (scale, offset) floats once at startup
+# -----------------------------
+def compile_calibration(cal: dict | None) -> dict[str, tuple[float, float]]:
+    """
+    Convert {channel: {"scale": .., "offset": ..}} from the config into
+    {channel: (scale, offset)}. Channels without calibration are left out.
+    """
+    return {
+        k: (float(c.get("scale", 1.0)), float(c.get("offset", 0.0)))
+        for k, c in (cal or {}).items()
+        if c
+    }
+
 # -----------------------------
 # Convert given voltages to calibrated values using provided calibration data
 # -----------------------------
-def apply_calibration(vals: dict, cal: dict | None):
+def apply_calibration(vals: dict, cal: dict[str, tuple[float, float]] | None):
     """
     Apply calibration (scale and offset) to ADC values if calibration is provided.
+    cal: output of compile_calibration().
     Channels with None values are left as None.
     """
     if not cal:
@@ -104,11 +208,10 @@ def apply_calibration(vals: dict, cal: dict | None):
         if v is None:
             out[k] = None
             continue
-        c = cal.get(k)
-        if c:
-            scale = float(c.get("scale", 1.0))
-            offset = float(c.get("offset", 0.0))
-            out[k] = v * scale + offset
-        else:
+        try:
+            scale, offset = cal[k]
+        except KeyError:
             out[k] = v
+            continue
+        out[k] = v * scale + offset
     return out
\ No newline at end of file